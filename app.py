@@ -1,24 +1,68 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
-import json
 import os
+import gzip
+import functools
+import threading
+import orjson
 from datetime import datetime
 from utils.gee_handler import GEEHandler
 from utils.model_predictor import CropPredictor
-from utils.map_generator import MapGenerator
+from utils.csv_exporter import CsvExporter
+from utils.json_provider import OrjsonProvider
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
-gee_handler = GEEHandler()
-crop_predictor = CropPredictor()
-map_generator = MapGenerator()
+csv_exporter = CsvExporter()
 
-with open('data/regions.json', 'r') as f:
-    regions_data = json.load(f)
+_services = None
+_services_lock = threading.Lock()
 
-with open('data/crop_data.json', 'r') as f:
-    crop_data = json.load(f)
+def get_services():
+    """Construct the GEE handler and crop predictor on first use"""
+    global _services
+    if _services is None:
+        with _services_lock:
+            if _services is None:
+                _services = (GEEHandler(), CropPredictor())
+    return _services
+
+_map_generator = None
+_map_generator_lock = threading.Lock()
+
+def get_map_generator():
+    """Construct the folium-backed map generator on first use"""
+    global _map_generator
+    if _map_generator is None:
+        with _map_generator_lock:
+            if _map_generator is None:
+                from utils.map_generator import MapGenerator
+                _map_generator = MapGenerator()
+    return _map_generator
+
+with open('data/regions.json', 'rb') as f:
+    regions_data = orjson.loads(f.read())
+
+with open('data/crop_data.json', 'rb') as f:
+    crop_data = orjson.loads(f.read())
+
+# Static payloads are serialized (and gzipped) once instead of per request
+_REGIONS_JSON = orjson.dumps(regions_data)
+_REGIONS_JSON_GZ = gzip.compress(_REGIONS_JSON)
+_CROPS_JSON = orjson.dumps(crop_data)
+_CROPS_JSON_GZ = gzip.compress(_CROPS_JSON)
+
+def _static_json_response(body, gzipped_body):
+    """Serve pre-serialized JSON, gzip-encoded when the client accepts it"""
+    if request.accept_encodings['gzip']:
+        response = Response(gzipped_body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(body, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 @app.route('/')
 def index():
@@ -28,12 +72,12 @@ def index():
 @app.route('/api/regions', methods=['GET'])
 def get_regions():
     """Get Indian administrative regions data"""
-    return jsonify(regions_data)
+    return _static_json_response(_REGIONS_JSON, _REGIONS_JSON_GZ)
 
 @app.route('/api/crop-types', methods=['GET'])
 def get_crop_types():
     """Get crop types and metadata"""
-    return jsonify(crop_data)
+    return _static_json_response(_CROPS_JSON, _CROPS_JSON_GZ)
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_region():
@@ -63,9 +107,11 @@ def analyze_region():
         
         print(f"Analyzing region: {region_name}")
         
+        gee_handler, crop_predictor = get_services()
+        
         features, ndvi_data = gee_handler.get_ndvi_features(geometry, start_date, end_date)
         
-        prediction = crop_predictor.predict_crop(features)
+        prediction = crop_predictor.submit(features)
         
         area_distribution = crop_predictor.predict_area_distribution(geometry, ndvi_data)
         
@@ -101,7 +147,7 @@ def export_csv():
         region_name = data.get('region_name', 'analysis')
         
         filename = f"{region_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        filepath = map_generator.export_to_csv(crop_distribution, filename)
+        filepath = csv_exporter.export_to_csv(crop_distribution, filename)
         
         return send_file(filepath, as_attachment=True, download_name=filename)
     
@@ -116,6 +162,7 @@ def export_geojson():
         geometry = data.get('geometry')
         properties = data.get('properties', {})
         
+        map_generator = get_map_generator()
         geojson = map_generator.generate_geojson(geometry, properties)
         
         return jsonify(geojson)
@@ -123,6 +170,35 @@ def export_geojson():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/export/map', methods=['POST'])
+def export_map():
+    """
+    Export analysis results as an interactive HTML map
+    
+    Expected JSON payload:
+    {
+        "center": [lat, lon],
+        "geometry": {...},
+        "crop_distribution": {...}
+    }
+    """
+    try:
+        data = request.get_json()
+        geometry = data.get('geometry')
+        center = data.get('center', [20.5937, 78.9629])
+        crop_distribution = data.get('crop_distribution', {})
+        
+        if not geometry:
+            return jsonify({'error': 'No geometry provided'}), 400
+        
+        map_generator = get_map_generator()
+        filepath = map_generator.render_results_map(center, geometry, crop_distribution)
+        
+        return send_from_directory(os.path.dirname(filepath), os.path.basename(filepath))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/generate-crop-map', methods=['POST'])
 def generate_crop_map():
     """
@@ -147,6 +223,7 @@ def generate_crop_map():
         
         print(f"Generating crop classification map...")
         
+        gee_handler, _ = get_services()
         crop_map_data = gee_handler.generate_crop_classification_map(geometry, start_date, end_date)
         
         return jsonify(crop_map_data)
@@ -155,24 +232,35 @@ def generate_crop_map():
         print(f"Error generating crop map: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# lru_cache is enough here: this only builds a small dict from the shared
+# services, so two threads racing on the first call just compute it twice
+@functools.lru_cache(maxsize=None)
+def _static_health():
+    """Health fields that can only change on restart, computed once"""
+    gee_handler, crop_predictor = get_services()
+    return {
+        'status': 'healthy',
+        'gee_initialized': gee_handler.initialized,
+        'model_loaded': crop_predictor.forest is not None,
+        'n_states': len(regions_data['states'])
+    }
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'gee_initialized': gee_handler.initialized,
-        'model_loaded': crop_predictor.model is not None,
-        'timestamp': datetime.now().isoformat()
-    })
+    return jsonify({**_static_health(), 'timestamp': datetime.now().isoformat()})
 
 if __name__ == '__main__':
+    gee_handler, crop_predictor = get_services()
+    
     print("\n" + "="*60)
     print("🌾 CROP CLASSIFICATION SYSTEM FOR INDIA")
     print("="*60)
     print(f"✓ Flask server starting...")
     print(f"✓ GEE Handler: {'Initialized' if gee_handler.initialized else 'Demo Mode'}")
-    print(f"✓ ML Model: {'Loaded' if crop_predictor.model else 'Not Available'}")
+    print(f"✓ ML Model: {'Loaded' if crop_predictor.forest is not None else 'Not Available'}")
     print(f"✓ Regions loaded: {len(regions_data['states'])} states")
     print("="*60 + "\n")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG') == '1')
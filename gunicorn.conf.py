@@ -0,0 +1,9 @@
+import os
+
+# Threaded workers overlap blocking Earth Engine round-trips and share one
+# in-process prediction batcher, so concurrent requests coalesce into batches.
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+worker_class = 'gthread'
+timeout = 120
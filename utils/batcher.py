@@ -0,0 +1,77 @@
+import queue
+import threading
+import time
+import numpy as np
+
+class PredictionBatcher:
+    """Coalesce concurrent single-row predictions into one batched model call"""
+
+    def __init__(self, predict_fn, max_batch=32, max_wait=0.01):
+        """
+        Args:
+            predict_fn: callable mapping an (n, n_features) array to n result rows
+            max_batch: largest number of requests served by one call
+            max_wait: seconds to wait for a batch to fill after the first request
+        """
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, features):
+        """Queue one feature vector and block until its result row is ready"""
+        self._ensure_worker()
+
+        done = threading.Event()
+        holder = {}
+        self._queue.put((features, done, holder))
+        done.wait()
+
+        if 'error' in holder:
+            raise holder['error']
+        return holder['result']
+
+    def _ensure_worker(self):
+        """Start the worker thread on first use (and again after a fork)"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name='prediction-batcher', daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._process(batch)
+
+    def _process(self, batch):
+        try:
+            # float32 rows (as produced by GEEHandler) stack without conversion
+            features_matrix = np.stack([
+                np.asarray(features, dtype=np.float32) for features, _, _ in batch
+            ])
+            results = self.predict_fn(features_matrix)
+            for (_, _, holder), row in zip(batch, results):
+                holder['result'] = row
+        except Exception as e:
+            for _, _, holder in batch:
+                holder['error'] = e
+        finally:
+            for _, done, _ in batch:
+                done.set()
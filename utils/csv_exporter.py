@@ -0,0 +1,30 @@
+import csv
+import os
+
+class CsvExporter:
+    """Export analysis results to CSV files"""
+    
+    def __init__(self, output_dir='static/exports'):
+        self.output_dir = output_dir
+    
+    def export_to_csv(self, crop_distribution, filename='crop_analysis.csv'):
+        """Export crop distribution to CSV"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        filepath = os.path.join(self.output_dir, filename)
+        
+        rows = (
+            [
+                crop_name,
+                crop_info.get('area_ha', 0),
+                crop_info.get('percentage', 0),
+                crop_info.get('confidence', 0)
+            ]
+            for crop_name, crop_info in crop_distribution.items()
+        )
+        
+        with open(filepath, 'w', newline='', buffering=1 << 16) as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['Crop Type', 'Area (Hectares)', 'Percentage', 'Confidence'])
+            writer.writerows(rows)
+        
+        return filepath
@@ -0,0 +1,134 @@
+import joblib
+import numpy as np
+from numba import njit
+from utils.persistence import dump_atomic
+
+# Bump when the packed layout changes so stale caches are rebuilt
+FOREST_LAYOUT_VERSION = 4
+
+FOREST_ARRAYS = ('children_left', 'children_right', 'feature', 'threshold', 'value')
+
+def pack_forest(model, scaler=None):
+    """
+    Flatten a fitted RandomForestClassifier into padded node arrays
+    
+    Args:
+        model: fitted RandomForestClassifier
+        scaler: optional StandardScaler the model was trained behind; its
+            affine transform is folded into the split thresholds so the
+            packed forest always takes raw features
+
+    Returns:
+        dict with the model's n_features and arrays shaped
+        (n_trees, max_nodes[, n_classes]); leaf values
+        are stored as class fractions so averaging them gives predict_proba.
+        Nodes use compact dtypes (int32 children, int16 features, float32
+        thresholds and values) to halve the bytes touched per traversal.
+    """
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    n_trees = len(trees)
+    max_nodes = max(tree.node_count for tree in trees)
+    n_classes = int(model.n_classes_)
+
+    children_left = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+    children_right = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+    feature = np.zeros((n_trees, max_nodes), dtype=np.int16)
+    threshold = np.zeros((n_trees, max_nodes), dtype=np.float32)
+    value = np.zeros((n_trees, max_nodes, n_classes), dtype=np.float32)
+
+    for i, tree in enumerate(trees):
+        n_nodes = tree.node_count
+        children_left[i, :n_nodes] = tree.children_left
+        children_right[i, :n_nodes] = tree.children_right
+        feature[i, :n_nodes] = np.maximum(tree.feature, 0)
+        node_threshold = tree.threshold
+        if scaler is not None:
+            split_feature = np.maximum(tree.feature, 0)
+            node_threshold = (node_threshold * scaler.scale_[split_feature] +
+                              scaler.mean_[split_feature])
+        threshold[i, :n_nodes] = _float32_floor(node_threshold)
+        node_values = tree.value[:, 0, :]
+        value[i, :n_nodes] = node_values / node_values.sum(axis=1, keepdims=True)
+
+    return {
+        'n_features': int(model.n_features_in_),
+        'children_left': children_left,
+        'children_right': children_right,
+        'feature': feature,
+        'threshold': threshold,
+        'value': value
+    }
+
+def _float32_floor(values):
+    """
+    Round float64 thresholds down to float32. For float32 inputs x,
+    x <= result holds exactly when x <= the original threshold, so
+    quantizing never changes which branch a sample takes.
+    """
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+def save_forest(path, forest):
+    """
+    Cache packed forest arrays uncompressed, so they can be memory-mapped.
+    Replaced atomically since other workers may have the old file mapped.
+    """
+    dump_atomic({'version': FOREST_LAYOUT_VERSION, **forest}, path, compress=0)
+
+def load_forest(path):
+    """
+    Memory-map packed forest arrays, or return None if the cache uses an
+    older layout. Read-only mappings are shared between worker processes
+    through the page cache instead of being copied into each heap.
+    """
+    data = joblib.load(path, mmap_mode='r')
+    if data.get('version') != FOREST_LAYOUT_VERSION:
+        return None
+    forest = {name: data[name] for name in FOREST_ARRAYS}
+    forest['n_features'] = int(data['n_features'])
+    return forest
+
+def forest_predict_proba(features, forest):
+    """Class probabilities for a float32 (n_samples, n_features) matrix"""
+    # The kernel is compiled without bounds checks, so a narrow row would
+    # read past the end of its features instead of failing
+    if features.ndim != 2 or features.shape[1] != forest['n_features']:
+        raise ValueError(
+            f"Expected features of shape (n_samples, {forest['n_features']}), "
+            f"got {features.shape}"
+        )
+    # NaN compares false at every split and would still land in some leaf
+    if not np.isfinite(features).all():
+        raise ValueError("Features contain NaN or infinite values")
+    return _rf_predict_proba(
+        features,
+        forest['children_left'],
+        forest['children_right'],
+        forest['feature'],
+        forest['threshold'],
+        forest['value']
+    )
+
+@njit(cache=True)
+def _rf_predict_proba(x, children_left, children_right, feature, threshold, value):
+    n_samples = x.shape[0]
+    n_trees = children_left.shape[0]
+    n_classes = value.shape[2]
+    proba = np.zeros((n_samples, n_classes))
+
+    for s in range(n_samples):
+        for t in range(n_trees):
+            node = 0
+            while children_left[t, node] != -1:
+                if x[s, feature[t, node]] <= threshold[t, node]:
+                    node = children_left[t, node]
+                else:
+                    node = children_right[t, node]
+            for c in range(n_classes):
+                proba[s, c] += value[t, node, c]
+        for c in range(n_classes):
+            proba[s, c] /= n_trees
+
+    return proba
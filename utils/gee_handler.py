@@ -1,18 +1,44 @@
 import os
+import io
 import json
-import ee
+import math
+import threading
+import numpy as np
+import requests
 from datetime import datetime, timedelta
+from operator import attrgetter
+from cachetools import TTLCache, cachedmethod
+from cachetools.keys import hashkey
+from utils.hashing import geom_key
+
+# Regions whose bounding box holds up to this many 30 m pixels are
+# downloaded and reduced locally
+DIRECT_DOWNLOAD_MAX_PIXELS = 250000
+# Fill value for pixels outside the region; below any valid NDVI
+NDVI_NODATA = -2
+
+
+def _ndvi_cache_key(self, geometry, start_date=None, end_date=None):
+    """Cache key over (geometry, start_date, end_date)"""
+    return hashkey(geom_key(geometry), start_date, end_date)
+
 
 class GEEHandler:
     """Handler for Google Earth Engine operations"""
     
     def __init__(self):
         self.initialized = False
+        # Recent successful NDVI reductions (one entry per region and date
+        # range), so re-analysing the same region skips GEE entirely
+        self._cache = TTLCache(maxsize=512, ttl=900)
+        self._cache_lock = threading.RLock()
         self.initialize_gee()
     
     def initialize_gee(self):
         """Initialize Google Earth Engine with service account or default credentials"""
         try:
+            import ee
+            
             service_account = os.getenv('GEE_SERVICE_ACCOUNT')
             private_key = os.getenv('GEE_PRIVATE_KEY')
             
@@ -46,69 +72,134 @@ class GEEHandler:
             return self._generate_demo_ndvi_data(geometry)
         
         try:
-            if not end_date:
-                end_date = datetime.now().strftime('%Y-%m-%d')
-            if not start_date:
-                start_date = (datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d')
-            
-            ee_geometry = self._convert_to_ee_geometry(geometry)
-            
-            collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
-                         .filterBounds(ee_geometry)
-                         .filterDate(start_date, end_date)
-                         .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)))
-            
-            def add_ndvi(image):
-                ndvi = image.normalizedDifference(['B8', 'B4']).rename('NDVI')
-                return image.addBands(ndvi)
-            
-            collection_with_ndvi = collection.map(add_ndvi)
-            
-            ndvi_median = collection_with_ndvi.select('NDVI').median()
-            ndvi_25th = collection_with_ndvi.select('NDVI').reduce(ee.Reducer.percentile([25]))
-            ndvi_75th = collection_with_ndvi.select('NDVI').reduce(ee.Reducer.percentile([75]))
-            
-            stats_median = ndvi_median.reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=ee_geometry,
-                scale=30,
-                maxPixels=1e9
-            ).getInfo()
-            
-            stats_25th = ndvi_25th.reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=ee_geometry,
-                scale=30,
-                maxPixels=1e9
-            ).getInfo()
-            
-            stats_75th = ndvi_75th.reduceRegion(
+            return self._fetch_ndvi(geometry, start_date, end_date)
+        except Exception as e:
+            print(f"Error fetching GEE data: {e}")
+            return self._generate_demo_ndvi_data(geometry)
+    
+    @cachedmethod(attrgetter('_cache'), key=_ndvi_cache_key, lock=attrgetter('_cache_lock'))
+    def _fetch_ndvi(self, geometry, start_date=None, end_date=None):
+        """
+        Compute NDVI statistics with GEE; raises on failure so that only
+        successful results are cached
+        """
+        import ee
+        
+        if not end_date:
+            end_date = datetime.now().strftime('%Y-%m-%d')
+        if not start_date:
+            start_date = (datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d')
+        
+        ee_geometry = self._convert_to_ee_geometry(geometry)
+        
+        collection = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
+                     .filterBounds(ee_geometry)
+                     .filterDate(start_date, end_date)
+                     .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)))
+        
+        def add_ndvi(image):
+            ndvi = image.normalizedDifference(['B8', 'B4']).rename('NDVI')
+            return image.addBands(ndvi)
+        
+        collection_with_ndvi = collection.map(add_ndvi)
+        
+        ndvi_percentiles = collection_with_ndvi.select('NDVI').reduce(
+            ee.Reducer.percentile([25, 50, 75])
+        )
+        
+        result = None
+        # Small regions: two requests (the getDownloadURL RPC, then the raster
+        # download), plus the reduceRegion call below if the download fails.
+        # Points have no area to download; they always reduce server-side.
+        if (geometry['type'] != 'Point' and
+                self._estimate_bbox_pixel_count(geometry) <= DIRECT_DOWNLOAD_MAX_PIXELS):
+            try:
+                # Image count rides along as a constant band instead of a separate call
+                ndvi_image = ndvi_percentiles.addBands(
+                    ee.Image.constant(collection.size()).rename('image_count')
+                )
+                result = self._download_ndvi_stats(ndvi_image, ee_geometry)
+                result['image_count'] = int(round(result.get('image_count', 0)))
+            except Exception as e:
+                print(f"Direct NDVI download failed, reducing server-side: {e}")
+                result = None
+        
+        if result is None:
+            stats = ndvi_percentiles.reduceRegion(
                 reducer=ee.Reducer.mean(),
                 geometry=ee_geometry,
                 scale=30,
                 maxPixels=1e9
-            ).getInfo()
-            
-            mean_ndvi = stats_median.get('NDVI', 0.5)
-            percentile_25 = stats_25th.get('NDVI_p25', stats_25th.get('NDVI', mean_ndvi - 0.15))
-            percentile_75 = stats_75th.get('NDVI_p75', stats_75th.get('NDVI', mean_ndvi + 0.15))
+            )
             
-            return {
-                'success': True,
-                'mean_ndvi': mean_ndvi,
-                'percentile_25': percentile_25,
-                'percentile_50': mean_ndvi,
-                'percentile_75': percentile_75,
-                'image_count': collection.size().getInfo(),
-                'start_date': start_date,
-                'end_date': end_date
-            }
-        except Exception as e:
-            print(f"Error fetching GEE data: {e}")
-            return self._generate_demo_ndvi_data(geometry)
+            # Single round-trip: percentiles and image count evaluated together
+            result = ee.Dictionary(stats).set('image_count', collection.size()).getInfo()
+        
+        mean_ndvi = result.get('NDVI_p50', 0.5)
+        percentile_25 = result.get('NDVI_p25', mean_ndvi - 0.15)
+        percentile_75 = result.get('NDVI_p75', mean_ndvi + 0.15)
+        
+        return {
+            'success': True,
+            'mean_ndvi': mean_ndvi,
+            'percentile_25': percentile_25,
+            'percentile_50': mean_ndvi,
+            'percentile_75': percentile_75,
+            'image_count': result.get('image_count', 0),
+            'start_date': start_date,
+            'end_date': end_date
+        }
+    
+    def _download_ndvi_stats(self, ndvi_percentiles, ee_geometry):
+        """
+        Download a small NDVI percentile raster and average each band locally
+        
+        Equivalent to reduceRegion(ee.Reducer.mean()) over the region, but
+        evaluated client-side on the pixels instead of by the GEE backend.
+        Costs two blocking requests: getDownloadURL, then the download itself.
+        """
+        image = ndvi_percentiles.clip(ee_geometry).unmask(NDVI_NODATA, False).toFloat()
+        url = image.getDownloadURL({
+            'region': ee_geometry,
+            'scale': 30,
+            'format': 'NPY'
+        })
+        
+        response = requests.get(url, timeout=60)
+        response.raise_for_status()
+        pixels = np.load(io.BytesIO(response.content))
+        
+        stats = {}
+        for band in pixels.dtype.names:
+            values = pixels[band]
+            values = values[values > NDVI_NODATA]
+            if values.size:
+                stats[band] = float(values.mean())
+        return stats
+    
+    def _estimate_bbox_pixel_count(self, geometry, scale=30):
+        """
+        Approximate number of scale-metre pixels in the geometry's bounding box,
+        without a GEE call. Downloads cover the whole box, not just the shape.
+        """
+        if geometry['type'] == 'Polygon':
+            ring = geometry['coordinates'][0]
+            lons = [c[0] for c in ring]
+            lats = [c[1] for c in ring]
+            west, east, south, north = min(lons), max(lons), min(lats), max(lats)
+        else:
+            west, south, east, north = geometry.get('bbox', [0, 0, 1, 1])
+        
+        metres_per_degree = 111320
+        mean_lat = math.radians((south + north) / 2)
+        width_m = abs(east - west) * metres_per_degree * math.cos(mean_lat)
+        height_m = abs(north - south) * metres_per_degree
+        return (width_m / scale) * (height_m / scale)
     
     def _convert_to_ee_geometry(self, geometry):
         """Convert GeoJSON geometry to EE geometry"""
+        import ee
+        
         if geometry['type'] == 'Polygon':
             coords = geometry['coordinates'][0]
             return ee.Geometry.Polygon(coords)
@@ -120,10 +211,10 @@ class GEEHandler:
     
     def _generate_demo_ndvi_data(self, geometry):
         """Generate simulated NDVI data for demo purposes"""
-        import random
-        random.seed(hash(str(geometry)) % 1000)
+        # Local generator: seeding the global random module is not thread-safe
+        rng = np.random.default_rng(geom_key(geometry))
         
-        base_ndvi = random.uniform(0.4, 0.7)
+        base_ndvi = float(rng.uniform(0.4, 0.7))
         
         return {
             'success': True,
@@ -132,7 +223,7 @@ class GEEHandler:
             'percentile_25': max(0.1, base_ndvi - 0.15),
             'percentile_50': base_ndvi,
             'percentile_75': min(0.9, base_ndvi + 0.15),
-            'image_count': random.randint(5, 15),
+            'image_count': int(rng.integers(5, 16)),
             'start_date': (datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d'),
             'end_date': datetime.now().strftime('%Y-%m-%d')
         }
@@ -141,14 +232,14 @@ class GEEHandler:
         """Extract NDVI-based features for ML model"""
         ndvi_data = self.get_sentinel2_ndvi(geometry, start_date, end_date)
         
-        features = [
+        features = np.array([
             ndvi_data['mean_ndvi'],
             ndvi_data['percentile_25'],
             ndvi_data['percentile_50'],
             ndvi_data['percentile_75'],
             ndvi_data['percentile_75'] - ndvi_data['percentile_25'],
             ndvi_data.get('image_count', 10) / 10.0
-        ]
+        ], dtype=np.float32)
         
         return features, ndvi_data
     
@@ -163,6 +254,8 @@ class GEEHandler:
             return self._generate_demo_crop_map(geometry)
         
         try:
+            import ee
+            
             if not end_date:
                 end_date = datetime.now().strftime('%Y-%m-%d')
             if not start_date:
@@ -0,0 +1,12 @@
+import hashlib
+import orjson
+
+def geom_key(geometry):
+    """
+    Stable 64-bit content hash of a GeoJSON-like object
+
+    Unlike hash(str(...)), the result does not depend on key order or on
+    per-process string hash salting, so every worker derives the same key.
+    """
+    canonical = orjson.dumps(geometry, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return int.from_bytes(hashlib.blake2b(canonical, digest_size=8).digest(), 'little')
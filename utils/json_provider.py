@@ -0,0 +1,22 @@
+import orjson
+from flask.json.provider import JSONProvider
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, with native numpy support"""
+
+    option = orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj, **kwargs):
+        """Serialize obj to a JSON string"""
+        return orjson.dumps(obj, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        """Deserialize a JSON str or bytes payload"""
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Build a JSON response from the orjson bytes without a decode round-trip"""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=self.option), mimetype='application/json'
+        )
@@ -1,7 +1,10 @@
-import folium
-from folium import plugins
 import json
 import os
+import tempfile
+from utils.hashing import geom_key
+
+# Upper bound on rendered result maps kept in static/maps
+MAX_CACHED_MAPS = 256
 
 class MapGenerator:
     """Generate interactive maps and visualizations"""
@@ -12,6 +15,8 @@ class MapGenerator:
     
     def create_base_map(self, center=None, zoom=None):
         """Create a base Folium map of India"""
+        import folium
+        
         if not center:
             center = self.default_center
         if not zoom:
@@ -28,6 +33,8 @@ class MapGenerator:
     
     def add_crop_layer(self, map_obj, geometry, crop_data, crop_name, color):
         """Add a crop classification layer to the map"""
+        import folium
+        
         if geometry['type'] == 'Polygon':
             folium.GeoJson(
                 geometry,
@@ -45,13 +52,38 @@ class MapGenerator:
     
     def create_results_map(self, center, geometry, crop_distribution):
         """Create a map showing crop distribution results"""
+        import folium
+        
         m = self.create_base_map(center=center, zoom=10)
         
-        for crop_name, crop_info in crop_distribution.items():
-            if crop_info['percentage'] > 5:
-                self.add_crop_layer(
-                    m, geometry, crop_info, crop_name, crop_info['color']
-                )
+        # One FeatureCollection layer styled per feature, instead of one
+        # GeoJson layer (and template render) per crop
+        features = [
+            {
+                'type': 'Feature',
+                'geometry': geometry,
+                'properties': {
+                    'name': crop_name,
+                    'color': crop_info['color'],
+                    'label': f"{crop_name}: {crop_info.get('area_ha', 0):.2f} ha"
+                }
+            }
+            for crop_name, crop_info in crop_distribution.items()
+            if crop_info['percentage'] > 5
+        ]
+        
+        if features and geometry['type'] == 'Polygon':
+            folium.GeoJson(
+                {'type': 'FeatureCollection', 'features': features},
+                name='Crop distribution',
+                style_function=lambda feature: {
+                    'fillColor': feature['properties']['color'],
+                    'color': feature['properties']['color'],
+                    'weight': 2,
+                    'fillOpacity': 0.5
+                },
+                tooltip=folium.GeoJsonTooltip(fields=['label'], labels=False)
+            ).add_to(m)
         
         folium.LayerControl().add_to(m)
         
@@ -65,6 +97,62 @@ class MapGenerator:
         map_obj.save(filepath)
         return filepath
     
+    def render_results_map(self, center, geometry, crop_distribution):
+        """
+        Render the results map to an HTML file, reusing an identical earlier render
+        
+        Returns:
+            path of the HTML file under static/maps
+        """
+        key = geom_key({
+            'center': center,
+            'geometry': geometry,
+            'crop_distribution': crop_distribution
+        })
+        filename = f"results_{key:016x}.html"
+        filepath = os.path.join('static/maps', filename)
+        
+        try:
+            # Touch to mark as recently used; fails if never rendered or just evicted
+            os.utime(filepath)
+            return filepath
+        except FileNotFoundError:
+            pass
+        
+        m = self.create_results_map(center, geometry, crop_distribution)
+        
+        # Render under a unique temporary name so concurrent renders of the
+        # same map never share a file and readers never see a partial one
+        os.makedirs('static/maps', exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir='static/maps', suffix='.tmp')
+        os.close(fd)
+        try:
+            m.save(tmp_path)
+            os.replace(tmp_path, filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict_cached_maps()
+        
+        return filepath
+    
+    def _evict_cached_maps(self):
+        """Delete the least recently used result maps beyond MAX_CACHED_MAPS"""
+        output_dir = 'static/maps'
+        cached = [
+            entry for entry in os.scandir(output_dir)
+            if entry.name.startswith('results_') and entry.name.endswith('.html')
+        ]
+        if len(cached) <= MAX_CACHED_MAPS:
+            return
+        
+        cached.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in cached[:len(cached) - MAX_CACHED_MAPS]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    
     def generate_geojson(self, geometry, properties):
         """Generate GeoJSON for download"""
         geojson = {
@@ -73,24 +161,3 @@ class MapGenerator:
             'properties': properties
         }
         return geojson
-    
-    def export_to_csv(self, crop_distribution, filename='crop_analysis.csv'):
-        """Export crop distribution to CSV"""
-        import csv
-        output_dir = 'static/exports'
-        os.makedirs(output_dir, exist_ok=True)
-        filepath = os.path.join(output_dir, filename)
-        
-        with open(filepath, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['Crop Type', 'Area (Hectares)', 'Percentage', 'Confidence'])
-            
-            for crop_name, crop_info in crop_distribution.items():
-                writer.writerow([
-                    crop_name,
-                    crop_info.get('area_ha', 0),
-                    crop_info.get('percentage', 0),
-                    crop_info.get('confidence', 0)
-                ])
-        
-        return filepath
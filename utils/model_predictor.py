@@ -1,9 +1,8 @@
 import os
-import joblib
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
 import json
+from utils.batcher import PredictionBatcher
+from utils.hashing import geom_key
 
 class CropPredictor:
     """Machine Learning model for crop classification"""
@@ -12,17 +11,50 @@ class CropPredictor:
         self.model_path = model_path
         self.model = None
         self.scaler = None
+        self.forest = None
+        self.forest_path = os.path.splitext(model_path)[0] + '_forest.joblib'
         self.crop_labels = ['Paddy/Rice', 'Millet/Pulses', 'Cash Crops', 'Fallow/Barren']
         self.crop_colors = ['#2ecc71', '#f39c12', '#8b4513', '#95a5a6']
+        self._batcher = PredictionBatcher(self._predict_proba_batch)
         self.load_or_create_model()
     
     def load_or_create_model(self):
-        """Load existing model or create a new pre-trained one"""
+        """
+        Load the packed forest used for inference. The sklearn model is only
+        unpickled (or trained) when the forest cache is missing or stale, so
+        workers normally hold just the shared memory-mapped arrays.
+        """
+        from utils.forest_kernel import pack_forest, save_forest, load_forest
+        
+        if (os.path.exists(self.model_path) and os.path.exists(self.forest_path) and
+                os.path.getmtime(self.forest_path) >= os.path.getmtime(self.model_path)):
+            try:
+                self.forest = load_forest(self.forest_path)
+            except Exception as e:
+                print(f"⚠ Error loading forest arrays: {e}, repacking")
+        
+        if self.forest is not None:
+            print("✓ Loaded pre-trained crop classification model")
+            return
+        
+        self.load_or_create_sklearn_model()
+        self.forest = pack_forest(self.model, self.scaler)
+        save_forest(self.forest_path, self.forest)
+    
+    def load_or_create_sklearn_model(self):
+        """Load the sklearn model behind the forest cache, or create a new pre-trained one"""
+        import joblib
+        
         if os.path.exists(self.model_path):
             try:
-                saved_data = joblib.load(self.model_path)
-                self.model = saved_data['model']
-                self.scaler = saved_data['scaler']
+                saved_data = joblib.load(self.model_path, mmap_mode='r')
+                if isinstance(saved_data, dict):
+                    # Older single-file format bundling model and scaler
+                    self.model = saved_data['model']
+                    self.scaler = saved_data['scaler']
+                else:
+                    self.model = saved_data
+                    self.scaler = None
                 print("✓ Loaded pre-trained crop classification model")
             except Exception as e:
                 print(f"⚠ Error loading model: {e}, creating new one")
@@ -32,49 +64,40 @@ class CropPredictor:
     
     def create_pretrained_model(self):
         """Create and save a pre-trained Random Forest model with synthetic data"""
+        from sklearn.ensemble import RandomForestClassifier
+        from utils.persistence import dump_atomic
+        
         print("Creating pre-trained crop classification model...")
         
-        np.random.seed(42)
+        rng = np.random.default_rng(42)
         n_samples = 1000
+        n_per_class = n_samples // 4
+        
+        # (mean_low, mean_high, p25_low, p75_high) NDVI bounds per crop class
+        class_ndvi_bounds = [
+            (0.6, 0.85, 0.55, 0.9),
+            (0.4, 0.6, 0.35, 0.65),
+            (0.5, 0.7, 0.45, 0.75),
+            (0.1, 0.35, 0.05, 0.4)
+        ]
+        
+        blocks = []
+        for mean_low, mean_high, p25_low, p75_high in class_ndvi_bounds:
+            ndvi_mean = rng.uniform(mean_low, mean_high, n_per_class)
+            ndvi_25 = rng.uniform(p25_low, ndvi_mean)
+            ndvi_75 = rng.uniform(ndvi_mean, p75_high)
+            ndvi_range = ndvi_75 - ndvi_25
+            image_count = rng.uniform(0.5, 1.5, n_per_class)
+            
+            blocks.append(np.column_stack(
+                [ndvi_mean, ndvi_25, ndvi_mean, ndvi_75, ndvi_range, image_count]
+            ))
         
-        X_train = []
-        y_train = []
-        
-        for crop_id in range(4):
-            for _ in range(n_samples // 4):
-                if crop_id == 0:
-                    ndvi_mean = np.random.uniform(0.6, 0.85)
-                    ndvi_25 = np.random.uniform(0.55, ndvi_mean)
-                    ndvi_50 = ndvi_mean
-                    ndvi_75 = np.random.uniform(ndvi_mean, 0.9)
-                elif crop_id == 1:
-                    ndvi_mean = np.random.uniform(0.4, 0.6)
-                    ndvi_25 = np.random.uniform(0.35, ndvi_mean)
-                    ndvi_50 = ndvi_mean
-                    ndvi_75 = np.random.uniform(ndvi_mean, 0.65)
-                elif crop_id == 2:
-                    ndvi_mean = np.random.uniform(0.5, 0.7)
-                    ndvi_25 = np.random.uniform(0.45, ndvi_mean)
-                    ndvi_50 = ndvi_mean
-                    ndvi_75 = np.random.uniform(ndvi_mean, 0.75)
-                else:
-                    ndvi_mean = np.random.uniform(0.1, 0.35)
-                    ndvi_25 = np.random.uniform(0.05, ndvi_mean)
-                    ndvi_50 = ndvi_mean
-                    ndvi_75 = np.random.uniform(ndvi_mean, 0.4)
-                
-                ndvi_range = ndvi_75 - ndvi_25
-                image_count = np.random.uniform(0.5, 1.5)
-                
-                features = [ndvi_mean, ndvi_25, ndvi_50, ndvi_75, ndvi_range, image_count]
-                X_train.append(features)
-                y_train.append(crop_id)
-        
-        X_train = np.array(X_train)
-        y_train = np.array(y_train)
-        
-        self.scaler = StandardScaler()
-        X_train_scaled = self.scaler.fit_transform(X_train)
+        X_train = np.vstack(blocks)
+        y_train = np.repeat(np.arange(len(class_ndvi_bounds)), n_per_class)
+        
+        # Trees are invariant to per-feature scaling, so no StandardScaler
+        self.scaler = None
         
         self.model = RandomForestClassifier(
             n_estimators=100,
@@ -83,10 +106,11 @@ class CropPredictor:
             min_samples_leaf=2,
             random_state=42
         )
-        self.model.fit(X_train_scaled, y_train)
+        self.model.fit(X_train, y_train)
         
-        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        joblib.dump({'model': self.model, 'scaler': self.scaler}, self.model_path)
+        # Uncompressed so the model can be loaded with mmap_mode; replaced
+        # atomically since other workers may have the old file mapped
+        dump_atomic(self.model, self.model_path, compress=0)
         print(f"✓ Created and saved model to {self.model_path}")
     
     def predict_crop(self, features):
@@ -94,40 +118,74 @@ class CropPredictor:
         Predict crop type from NDVI features
         
         Args:
-            features: list of NDVI-based features
+            features: NDVI-based features, as a list or 1-D array
         
         Returns:
             dict with prediction results
         """
-        if self.model is None:
+        if self.forest is None:
             return self._get_demo_prediction()
         
         try:
-            features_array = np.array(features).reshape(1, -1)
-            features_scaled = self.scaler.transform(features_array)
-            
-            prediction = self.model.predict(features_scaled)[0]
-            probabilities = self.model.predict_proba(features_scaled)[0]
-            
-            crop_distributions = {}
-            for i, crop in enumerate(self.crop_labels):
-                crop_distributions[crop] = {
-                    'probability': float(probabilities[i]),
-                    'color': self.crop_colors[i]
-                }
-            
-            return {
-                'predicted_crop': self.crop_labels[prediction],
-                'crop_id': int(prediction),
-                'confidence': float(probabilities[prediction]),
-                'color': self.crop_colors[prediction],
-                'all_probabilities': crop_distributions,
-                'features': features
-            }
+            if isinstance(features, np.ndarray):
+                features_array = features.reshape(1, -1)
+            else:
+                features_array = np.array(features).reshape(1, -1)
+            probabilities = self._predict_proba_batch(features_array)[0]
+            return self._format_prediction(probabilities, features)
         except Exception as e:
             print(f"Prediction error: {e}")
             return self._get_demo_prediction()
     
+    def submit(self, features):
+        """
+        Predict crop type through the shared micro-batching queue
+        
+        Concurrent callers are served by a single predict_proba call over
+        the stacked feature rows; the result matches predict_crop.
+        """
+        if self.forest is None:
+            return self._get_demo_prediction()
+        
+        try:
+            # Checked before queueing: a malformed row would fail the whole batch
+            if np.shape(features) != (self.forest['n_features'],):
+                raise ValueError(
+                    f"Expected {self.forest['n_features']} features, got shape {np.shape(features)}"
+                )
+            probabilities = self._batcher.submit(features)
+            return self._format_prediction(probabilities, features)
+        except Exception as e:
+            print(f"Prediction error: {e}")
+            return self._get_demo_prediction()
+    
+    def _predict_proba_batch(self, features_matrix):
+        """Class probabilities for an (n_samples, n_features) matrix"""
+        from utils.forest_kernel import forest_predict_proba
+        
+        # Trees compare float32 features, as sklearn does internally
+        return forest_predict_proba(np.asarray(features_matrix, dtype=np.float32), self.forest)
+    
+    def _format_prediction(self, probabilities, features):
+        """Build the prediction response from one row of class probabilities"""
+        prediction = int(np.argmax(probabilities))
+        
+        crop_distributions = {}
+        for i, crop in enumerate(self.crop_labels):
+            crop_distributions[crop] = {
+                'probability': probabilities[i],
+                'color': self.crop_colors[i]
+            }
+        
+        return {
+            'predicted_crop': self.crop_labels[prediction],
+            'crop_id': prediction,
+            'confidence': probabilities[prediction],
+            'color': self.crop_colors[prediction],
+            'all_probabilities': crop_distributions,
+            'features': features
+        }
+    
     def _get_demo_prediction(self):
         """Generate demo prediction when model is unavailable"""
         return {
@@ -149,8 +207,7 @@ class CropPredictor:
         Simulate crop distribution across an area
         Returns area statistics for different crop types
         """
-        import random
-        random.seed(hash(str(geometry)) % 1000)
+        rng = np.random.default_rng(geom_key(geometry))
         
         mean_ndvi = ndvi_data.get('mean_ndvi', 0.5)
         
@@ -167,13 +224,15 @@ class CropPredictor:
             dominant_crop = 3
             distribution = [0.05, 0.15, 0.10, 0.70]
         
-        variation = [random.uniform(-0.05, 0.05) for _ in range(4)]
-        distribution = [max(0.01, d + v) for d, v in zip(distribution, variation)]
+        base = np.array(distribution)
+        distribution = np.maximum(0.01, base + rng.uniform(-0.05, 0.05, size=base.size))
+        distribution /= distribution.sum()
         
-        total = sum(distribution)
-        distribution = [d / total for d in distribution]
+        area_estimate = rng.uniform(10000, 50000)
         
-        area_estimate = random.uniform(10000, 50000)
+        areas = np.round(distribution * area_estimate, 2).tolist()
+        percentages = np.round(distribution * 100, 2).tolist()
+        confidences = np.round(rng.uniform(0.75, 0.95, size=base.size), 2).tolist()
         
         result = {
             'total_area_ha': round(area_estimate, 2),
@@ -181,12 +240,13 @@ class CropPredictor:
             'crop_distribution': {}
         }
         
-        for i, crop in enumerate(self.crop_labels):
+        for crop, color, area, percentage, confidence in zip(
+                self.crop_labels, self.crop_colors, areas, percentages, confidences):
             result['crop_distribution'][crop] = {
-                'area_ha': round(distribution[i] * area_estimate, 2),
-                'percentage': round(distribution[i] * 100, 2),
-                'color': self.crop_colors[i],
-                'confidence': round(random.uniform(0.75, 0.95), 2)
+                'area_ha': area,
+                'percentage': percentage,
+                'color': color,
+                'confidence': confidence
             }
         
         return result
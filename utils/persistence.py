@@ -0,0 +1,21 @@
+import os
+import tempfile
+import joblib
+
+def dump_atomic(obj, path, **kwargs):
+    """
+    joblib.dump to a temporary file in the same directory, then os.replace
+    it over path. Processes that memory-mapped the previous file keep
+    reading its (now unlinked) inode instead of seeing it truncated and
+    rewritten in place, which would fault with SIGBUS.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        joblib.dump(obj, tmp_path, **kwargs)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)